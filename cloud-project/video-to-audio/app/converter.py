@@ -1,78 +1,281 @@
 # app/converter.py
 """
 Simple FFmpeg-based video -> audio converter.
-Provides convert_to_audio(input_path, output_path, codec='mp3', quality=2)
+Provides convert_to_audio(input_path, output_path, codec='mp3', quality=2, output_stream=None)
 """
 
+import collections
+import functools
+import os
 import shutil
+import stat
 import subprocess
-from pathlib import Path
-from typing import Tuple
+import threading
+from typing import BinaryIO, Optional, Tuple
+
+# Chunk size used when copying ffmpeg's stdout into a caller-supplied stream
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Lines of ffmpeg stderr kept for ConversionError messages
+STDERR_TAIL_LINES = 64
+
+# Inputs at least this large get a kernel readahead hint before ffmpeg starts
+READAHEAD_MIN_BYTES = 100 * 1024 * 1024
+
+# Container format to request from ffmpeg when writing to a pipe
+_PIPE_FORMATS = {"mp3": "mp3", "aac": "adts"}
+
+# ffmpeg argv pieces, built once and joined by tuple concatenation per call
+_GLOBAL_ARGS = ("-y", "-nostats", "-loglevel", "error")
+# -vn: no video, -q:a: variable bitrate quality for libmp3lame (0..9), value appended per call
+_MP3_ARGS = ("-vn", "-acodec", "libmp3lame", "-q:a")
+_FAST_MP3_ARGS = ("-compression_level", "9")
+_LIBFDK_AAC_ARGS = ("-c:a", "libfdk_aac", "-vbr", "4")
+_NATIVE_AAC_ARGS = ("-c:a", "aac", "-b:a", "128k")
+# copy the audio stream (container must support the audio format)
+_COPY_ARGS = ("-vn", "-c:a", "copy")
+
+# Write MP4/M4A as fragmented MP4 in one forward pass. Outputs are audio-only,
+# and frag_keyframe only cuts fragments on video keyframes, so fragments are
+# cut every 10 s (in microseconds) instead; otherwise the mov muxer would hold
+# the whole output in memory until the trailer
+_MP4_EXTENSIONS = (".m4a", ".mp4")
+_FRAGMENTED_MP4_ARGS = ("-movflags", "+empty_moov", "-frag_duration", "10000000")
+
+# Source audio codecs that can be stream-copied, and the file extension to copy them into
+_COPY_EXTENSIONS = {"mp3": ".mp3", "aac": ".m4a"}
 
 class ConversionError(RuntimeError):
     pass
 
+@functools.lru_cache(maxsize=None)
+def _binary_path(name: str) -> Optional[str]:
+    """Absolute path of an ffmpeg tool on PATH, looked up once per process."""
+    return shutil.which(name)
+
 def _ffmpeg_exists() -> bool:
     """Return True if ffmpeg binary is available on PATH."""
-    return shutil.which("ffmpeg") is not None
+    return _binary_path("ffmpeg") is not None
+
+def require_ffmpeg() -> str:
+    """Return the absolute ffmpeg path, raising ConversionError if it is missing."""
+    if not _ffmpeg_exists():
+        raise ConversionError("ffmpeg not found on PATH. Install ffmpeg and retry.")
+    return _binary_path("ffmpeg")
 
-def convert_to_audio(input_path: str, output_path: str, codec: str = "mp3", quality: int = 2) -> Tuple[int, str]:
+@functools.lru_cache(maxsize=1)
+def _available_encoders() -> frozenset:
+    """Return the names of the encoders this ffmpeg build was compiled with (cached)."""
+    try:
+        proc = subprocess.run([_binary_path("ffmpeg") or "ffmpeg", "-hide_banner", "-encoders"],
+                              capture_output=True, text=True)
+    except OSError:
+        return frozenset()
+    names = set()
+    for line in proc.stdout.splitlines():
+        # Encoder lines look like: " A....D libmp3lame  libmp3lame MP3 (MPEG audio layer 3)"
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            names.add(parts[1])
+    return frozenset(names)
+
+def _aac_encoder_args() -> tuple:
+    """Prefer the Fraunhofer AAC encoder when ffmpeg was built with it."""
+    if "libfdk_aac" in _available_encoders():
+        return _LIBFDK_AAC_ARGS
+    return _NATIVE_AAC_ARGS
+
+def _codec_args(codec: str, quality: int, fast: bool) -> tuple:
+    """Audio arguments placed between the input and the output."""
+    if codec == "mp3":
+        args = _MP3_ARGS + (str(quality),)
+        return args + _FAST_MP3_ARGS if fast else args
+    if codec == "aac":
+        return ("-vn",) + _aac_encoder_args()
+    if codec == "copy":
+        return _COPY_ARGS
+    raise ConversionError(f"Unsupported codec: {codec}")
+
+@functools.lru_cache(maxsize=256)
+def _probe_audio_codec_cached(input_path: str, mtime_ns: int, size: int) -> Optional[str]:
+    """Cached ffprobe lookup; mtime/size are part of the key so edited files are re-probed."""
+    try:
+        proc = subprocess.run(
+            [_binary_path("ffprobe") or "ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name", "-of", "csv=p=0", input_path],
+            capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return proc.stdout.strip() or None
+
+def _probe_audio_codec(input_path: str, input_stat: Optional[os.stat_result] = None) -> Optional[str]:
+    """Return the codec name of the first audio stream, or None if unknown."""
+    if input_stat is None:
+        try:
+            input_stat = os.stat(input_path)
+        except OSError:
+            # Unreadable or missing: leave it to ffmpeg to report
+            return None
+    return _probe_audio_codec_cached(input_path, input_stat.st_mtime_ns, input_stat.st_size)
+
+def _prefetch_input(input_path: str, size: Optional[int]) -> None:
+    """
+    Ask the kernel to start reading a large input into the page cache.
+
+    ffmpeg keeps opening the file by path (MP4 inputs need to seek, which a
+    pipe:0 stdin can't), but it then finds the data already cached instead
+    of paying for many small reads on slow/network mounts. The size comes
+    from the caller's stat, so smaller (or unknown-size) inputs cost nothing.
+    """
+    if size is None or size < READAHEAD_MIN_BYTES or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(input_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+def convert_to_audio(
+    input_path: str,
+    output_path: Optional[str],
+    codec: str = "mp3",
+    quality: int = 2,
+    output_stream: Optional[BinaryIO] = None,
+    threads: int = 0,
+    fast: bool = False,
+    copy_if_compatible: bool = False,
+    skip_checks: bool = False,
+    input_stat: Optional[os.stat_result] = None,
+) -> Tuple[int, str]:
     """
     Convert input video file to an audio file.
 
     Args:
       input_path: path to input video
-      output_path: path to output audio (extension should match codec, e.g., .mp3)
+      output_path: path to output audio (extension should match codec, e.g., .mp3).
+        Ignored when output_stream is given.
       codec: 'mp3' or 'aac' or 'copy' (copy will copy audio stream if compatible)
       quality: for mp3 - qscale (0 best, 9 worst). We'll map to ffmpeg args.
+      output_stream: optional writable binary file-like object. When given, ffmpeg
+        writes to stdout and the audio is streamed straight into it instead of
+        being written to output_path first.
+      threads: ffmpeg threads, applied to the decoder, the filter graph and the
+        encoder separately (libmp3lame ignores it). 0 lets ffmpeg pick per core count.
+      fast: for mp3 - trade a little quality for encoding speed (lame -compression_level 9).
+      copy_if_compatible: if the source audio is already MP3 or AAC, copy the stream
+        instead of re-encoding. The output extension is changed to match the source
+        codec (.mp3 or .m4a), so use the returned path.
+      skip_checks: skip the input existence check, for callers that already
+        stat-ed the file. ffmpeg still reports a missing input as a failure.
+      input_stat: os.stat() result for input_path, if the caller has one. It is
+        reused for the probe cache key and the readahead size check, so the
+        input isn't stat-ed again.
 
     Returns:
-      (return_code, output_path)
+      (return_code, output_path) - output_path is "pipe:1" when streaming, and may
+      differ in extension from the requested one when copy_if_compatible is set
 
     Raises:
       ConversionError on obvious problems.
     """
     input_path = str(input_path)
-    output_path = str(output_path)
 
     # Basic checks
-    if not _ffmpeg_exists():
-        raise ConversionError("ffmpeg not found on PATH. Install ffmpeg and retry.")
+    ffmpeg = require_ffmpeg()
 
-    inp = Path(input_path)
-    if not inp.exists() or not inp.is_file():
-        raise ConversionError(f"Input file not found: {input_path}")
+    if input_stat is None and not skip_checks:
+        try:
+            input_stat = os.stat(input_path)
+        except OSError:
+            input_stat = None
+        if input_stat is None or not stat.S_ISREG(input_stat.st_mode):
+            raise ConversionError(f"Input file not found: {input_path}")
+
+    if output_stream is not None:
+        if codec not in _PIPE_FORMATS:
+            raise ConversionError(f"Codec {codec!r} cannot be streamed; use 'mp3' or 'aac'")
+        # -f is required since there is no file extension to infer the muxer from
+        output_path = "pipe:1"
+        output_args = ("-f", _PIPE_FORMATS[codec], output_path)
+    else:
+        output_path = str(output_path)
+        if copy_if_compatible:
+            source_codec = _probe_audio_codec(input_path, input_stat)
+            if source_codec in _COPY_EXTENSIONS:
+                codec = "copy"
+                output_path = os.path.splitext(output_path)[0] + _COPY_EXTENSIONS[source_codec]
+        if output_path.endswith(_MP4_EXTENSIONS):
+            output_args = _FRAGMENTED_MP4_ARGS + (output_path,)
+        else:
+            output_args = (output_path,)
 
-    out = Path(output_path)
-    out_parent = out.parent
-    out_parent.mkdir(parents=True, exist_ok=True)
+    codec_args = _codec_args(codec, quality, fast)
+    if output_stream is None:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
 
     # Build ffmpeg command
-    if codec == "mp3":
-        # -vn: no video, -q:a: variable bitrate quality for libmp3lame (0..9)
-        cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-vn", "-acodec", "libmp3lame",
-            "-q:a", str(int(quality)),
-            output_path
-        ]
-    elif codec == "aac":
-        cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-vn", "-c:a", "aac",
-            "-b:a", "128k",
-            output_path
-        ]
-    elif codec == "copy":
-        # copy the audio stream (container must support the audio format)
-        cmd = ["ffmpeg", "-y", "-i", input_path, "-vn", "-c:a", "copy", output_path]
-    else:
-        raise ConversionError(f"Unsupported codec: {codec}")
+    # -threads is per stream: before -i it limits the decoder, after the
+    # codec args the encoder
+    threads = str(threads)
+    cmd = (
+        (ffmpeg,) + _GLOBAL_ARGS
+        + ("-filter_threads", threads, "-threads", threads, "-i", input_path)
+        + codec_args + ("-threads", threads) + output_args
+    )
 
-    proc = subprocess.run(cmd, capture_output=True)
+    _prefetch_input(input_path, input_stat.st_size if input_stat is not None else None)
+    returncode, stderr = _run_ffmpeg(cmd, output_stream)
 
-    if proc.returncode != 0:
-        stderr = proc.stderr.decode("utf-8", errors="ignore")
-        raise ConversionError(f"ffmpeg failed (code {proc.returncode}): {stderr}")
+    if returncode != 0:
+        raise ConversionError(f"ffmpeg failed (code {returncode}): {stderr}")
+
+    return returncode, output_path
+
+
+def _run_ffmpeg(cmd, output_stream: Optional[BinaryIO] = None) -> Tuple[int, str]:
+    """
+    Run ffmpeg, optionally copying its stdout into output_stream.
+
+    Only the last STDERR_TAIL_LINES lines of stderr are kept (for error
+    messages), so long runs don't accumulate their whole log in memory.
+
+    Returns:
+      (return_code, stderr_tail)
+    """
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE if output_stream is not None else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        bufsize=STREAM_CHUNK_SIZE,
+    )
+
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr():
+        for line in proc.stderr:
+            stderr_tail.append(line)
+
+    if output_stream is None:
+        drain_stderr()
+    else:
+        # Drain stderr on a separate thread so ffmpeg can't block on a full
+        # stderr pipe while we are blocked reading stdout
+        drain = threading.Thread(target=drain_stderr, daemon=True)
+        drain.start()
+        try:
+            while chunk := proc.stdout.read(STREAM_CHUNK_SIZE):
+                output_stream.write(chunk)
+        finally:
+            proc.stdout.close()
+            drain.join()
 
-    return proc.returncode, output_path
+    returncode = proc.wait()
+    proc.stderr.close()
+    return returncode, b"".join(stderr_tail).decode("utf-8", errors="ignore")
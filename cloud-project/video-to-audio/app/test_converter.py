@@ -1,8 +1,10 @@
 # tests/test_converter.py
+import io
 import os
+import sys
 from pathlib import Path
 import pytest
-from app.converter import convert_to_audio, ConversionError
+from app.converter import convert_to_audio, ConversionError, STDERR_TAIL_LINES, _run_ffmpeg
 
 SAMPLE_DIR = Path(__file__).resolve().parent.parent / "sample_videos"
 SAMPLE_VIDEO = SAMPLE_DIR / "sample.mp4"
@@ -18,3 +20,111 @@ def test_convert_mp3(tmp_path):
 def test_missing_input():
     with pytest.raises(ConversionError):
         convert_to_audio("nonexistent_file.mp4", "/tmp/out.mp3")
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """Pretend ffmpeg is installed and record each argv instead of running it."""
+    monkeypatch.setattr("app.converter._ffmpeg_exists", lambda: True)
+    monkeypatch.setattr("app.converter._binary_path", lambda name: name)
+    calls = []
+    monkeypatch.setattr("app.converter._run_ffmpeg", lambda cmd, output_stream=None: calls.append(cmd) or (0, ""))
+    return calls
+
+def test_stream_rejects_copy_codec(tmp_path, fake_ffmpeg):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\0")
+    with pytest.raises(ConversionError):
+        convert_to_audio(str(src), None, codec="copy", output_stream=io.BytesIO())
+
+def test_aac_prefers_libfdk(tmp_path, monkeypatch, fake_ffmpeg):
+    monkeypatch.setattr("app.converter._available_encoders", lambda: frozenset({"libfdk_aac"}))
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\0")
+    convert_to_audio(str(src), str(tmp_path / "out.m4a"), codec="aac")
+    assert "libfdk_aac" in fake_ffmpeg[0]
+
+def test_aac_output_cuts_fragments_by_duration(tmp_path, fake_ffmpeg):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\0")
+    convert_to_audio(str(src), str(tmp_path / "out.m4a"), codec="aac")
+    cmd = fake_ffmpeg[0]
+    # Audio-only output has no keyframes to fragment on
+    assert cmd[cmd.index("-frag_duration") + 1] == "10000000"
+    assert "+frag_keyframe" not in " ".join(cmd)
+
+def test_threads_limit_decoder_and_encoder(tmp_path, fake_ffmpeg):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\0")
+    convert_to_audio(str(src), str(tmp_path / "out.mp3"), threads=2)
+    cmd = list(fake_ffmpeg[0])
+    input_index = cmd.index("-i")
+    thread_indexes = [i for i, arg in enumerate(cmd) if arg == "-threads"]
+    assert len(thread_indexes) == 2
+    assert thread_indexes[0] < input_index < thread_indexes[1]
+    assert all(cmd[i + 1] == "2" for i in thread_indexes)
+
+def test_copy_if_compatible_uses_source_extension(tmp_path, monkeypatch, fake_ffmpeg):
+    monkeypatch.setattr("app.converter._probe_audio_codec", lambda path, input_stat=None: "aac")
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\0")
+    code, path = convert_to_audio(str(src), str(tmp_path / "out.mp3"), copy_if_compatible=True)
+    assert path.endswith(".m4a")
+    assert "copy" in fake_ffmpeg[0]
+    assert "-frag_duration" in fake_ffmpeg[0]
+
+def test_skip_checks_leaves_missing_input_to_ffmpeg(monkeypatch, fake_ffmpeg):
+    monkeypatch.setattr("app.converter._run_ffmpeg", lambda cmd, output_stream=None: (1, "No such file or directory"))
+    with pytest.raises(ConversionError, match="No such file"):
+        convert_to_audio("nonexistent_file.mp4", "/tmp/out.mp3", skip_checks=True)
+
+def test_input_stat_is_reused_for_probe_and_readahead(tmp_path, monkeypatch, fake_ffmpeg):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\0")
+    input_stat = os.stat(src)
+    probes = []
+    monkeypatch.setattr("app.converter._probe_audio_codec_cached",
+                        lambda path, mtime_ns, size: probes.append((mtime_ns, size)) or "aac")
+    stat_calls = []
+    real_stat = os.stat
+    monkeypatch.setattr("app.converter.os.stat",
+                        lambda path, *args, **kwargs: stat_calls.append(str(path)) or real_stat(path, *args, **kwargs))
+    convert_to_audio(str(src), str(tmp_path / "out.mp3"), copy_if_compatible=True,
+                     skip_checks=True, input_stat=input_stat)
+    monkeypatch.undo()
+    assert str(src) not in stat_calls
+    assert probes == [(input_stat.st_mtime_ns, input_stat.st_size)]
+
+def test_skip_checks_probe_leaves_missing_input_to_ffmpeg(monkeypatch, fake_ffmpeg):
+    monkeypatch.setattr("app.converter._run_ffmpeg", lambda cmd, output_stream=None: (1, "No such file or directory"))
+    with pytest.raises(ConversionError, match="No such file"):
+        convert_to_audio("nonexistent_file.mp4", "/tmp/out.mp3", copy_if_compatible=True, skip_checks=True)
+
+# Stand-in for ffmpeg: writes far more stderr than a pipe buffer holds while
+# also streaming audio bytes to stdout, then exits with the given code
+STUB_FFMPEG = """
+import sys
+for i in range(200):
+    sys.stderr.write("frame %d %s\\n" % (i, "x" * 2048))
+    sys.stdout.buffer.write(bytes([i % 256]) * 16384)
+sys.exit(int(sys.argv[1]))
+"""
+
+def stub_ffmpeg_cmd(tmp_path, exit_code=0):
+    script = tmp_path / "stub_ffmpeg.py"
+    script.write_text(STUB_FFMPEG)
+    return (sys.executable, str(script), str(exit_code))
+
+def test_run_ffmpeg_streams_stdout_and_keeps_stderr_tail(tmp_path):
+    sink = io.BytesIO()
+    code, stderr = _run_ffmpeg(stub_ffmpeg_cmd(tmp_path), output_stream=sink)
+    assert code == 0
+    assert sink.getvalue() == b"".join(bytes([i % 256]) * 16384 for i in range(200))
+    lines = stderr.splitlines()
+    assert len(lines) == STDERR_TAIL_LINES
+    assert lines[0].startswith(f"frame {200 - STDERR_TAIL_LINES} ")
+    assert lines[-1].startswith("frame 199 ")
+
+def test_run_ffmpeg_without_stream_reports_failure(tmp_path):
+    code, stderr = _run_ffmpeg(stub_ffmpeg_cmd(tmp_path, exit_code=3))
+    assert code == 3
+    assert len(stderr.splitlines()) == STDERR_TAIL_LINES
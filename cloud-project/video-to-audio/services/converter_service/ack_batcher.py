@@ -0,0 +1,60 @@
+"""
+Batched RabbitMQ acks for the converter worker.
+
+Kept free of pika and database imports so it can be tested on its own.
+"""
+
+
+class AckBatcher:
+    """
+    Coalesces acks for one channel into basic_ack(multiple=True) frames.
+
+    Jobs finish out of order, so a multiple ack only covers tags below the
+    oldest delivery still in flight; anything left over is acked one by one
+    when the flush timer fires. All methods run on the connection's I/O thread.
+    """
+
+    def __init__(self, connection, channel, batch_size: int, flush_interval: float):
+        self.connection = connection
+        self.channel = channel
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.in_flight = set()
+        self.done = set()
+        self.flush_scheduled = False
+
+    def started(self, delivery_tag):
+        self.in_flight.add(delivery_tag)
+
+    def ack(self, delivery_tag):
+        self.in_flight.discard(delivery_tag)
+        self.done.add(delivery_tag)
+        if len(self.done) >= self.batch_size:
+            self.flush()
+        if self.done and not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.connection.call_later(self.flush_interval, self.flush_all)
+
+    def settled(self, delivery_tag):
+        """A message was nacked or retried individually."""
+        self.in_flight.discard(delivery_tag)
+
+    def flush(self):
+        """Ack every completed tag below the oldest in-flight delivery in one frame."""
+        if not self.done:
+            return
+        upto = min(self.in_flight) - 1 if self.in_flight else max(self.done)
+        covered = {tag for tag in self.done if tag <= upto}
+        if covered:
+            self.channel.basic_ack(delivery_tag=max(covered), multiple=True)
+            self.done -= covered
+
+    def flush_all(self):
+        self.flush_scheduled = False
+        if not self.channel.is_open:
+            return
+        self.flush()
+        # Completed jobs stuck behind a long-running one
+        for tag in sorted(self.done):
+            self.channel.basic_ack(delivery_tag=tag)
+        self.done.clear()
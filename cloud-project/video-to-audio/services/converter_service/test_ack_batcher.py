@@ -0,0 +1,65 @@
+# services/converter_service/test_ack_batcher.py
+import pytest
+from ack_batcher import AckBatcher
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.acks = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.timers = []
+
+    def call_later(self, delay, callback):
+        self.timers.append(callback)
+
+    def fire_timers(self):
+        timers, self.timers = self.timers, []
+        for callback in timers:
+            callback()
+
+
+@pytest.fixture
+def batcher():
+    return AckBatcher(FakeConnection(), FakeChannel(), batch_size=2, flush_interval=1.0)
+
+
+def test_multiple_ack_stops_below_oldest_in_flight(batcher):
+    for tag in (1, 2, 3):
+        batcher.started(tag)
+    batcher.ack(3)
+    batcher.ack(1)
+    # 2 is still converting, so only 1 may be covered
+    assert batcher.channel.acks == [(1, True)]
+    batcher.ack(2)
+    assert batcher.channel.acks == [(1, True), (3, True)]
+
+
+def test_individually_settled_tags_do_not_hold_back_the_batch(batcher):
+    for tag in (1, 2, 3):
+        batcher.started(tag)
+    # 1 was nacked or sent to the retry queue on its own
+    batcher.settled(1)
+    batcher.ack(3)
+    batcher.ack(2)
+    assert batcher.channel.acks == [(3, True)]
+
+
+def test_timer_acks_jobs_stuck_behind_a_long_running_one(batcher):
+    for tag in (1, 2, 3):
+        batcher.started(tag)
+    batcher.ack(3)
+    assert batcher.channel.acks == []
+    batcher.connection.fire_timers()
+    # 1 and 2 are still in flight: 3 is acked on its own, never with multiple
+    assert batcher.channel.acks == [(3, False)]
+    batcher.ack(2)
+    batcher.ack(1)
+    assert batcher.channel.acks == [(3, False), (2, True)]
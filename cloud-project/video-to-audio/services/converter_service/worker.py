@@ -4,20 +4,38 @@ and converts video files to audio using FFmpeg.
 """
 
 import os
-import json
+import orjson
 import pika
 from pathlib import Path
 from pymongo import MongoClient
+from pymongo import errors as pymongo_errors
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
 from datetime import datetime
 import sys
+import copy
+import re
 import time
+import base64
+import urllib.error
+import urllib.parse
+import urllib.request
+import functools
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pika import exceptions as pika_exceptions
 
 # Add app directory to path to import converter
 sys.path.insert(0, str(Path(__file__).parent / "app"))
-from converter import convert_to_audio, ConversionError
+from converter import convert_to_audio, require_ffmpeg, ConversionError
+from ack_batcher import AckBatcher
+
+# Fail on deploy rather than on every job if the image lacks ffmpeg
+require_ffmpeg()
 
 # Configuration
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "localhost")
@@ -26,8 +44,32 @@ RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
 RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "guest")
 RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE", "video_conversion_queue")
 
+# Failed jobs are retried through a delay queue whose expired messages flow back
+# into RABBITMQ_QUEUE; messages that can't be processed are dead-lettered to
+# RABBITMQ_FAILED_QUEUE instead of being requeued forever.
+RABBITMQ_DEAD_LETTER_EXCHANGE = os.getenv("RABBITMQ_DEAD_LETTER_EXCHANGE", "dlx")
+RABBITMQ_RETRY_QUEUE = os.getenv("RABBITMQ_RETRY_QUEUE", f"{RABBITMQ_QUEUE}.retry")
+RABBITMQ_FAILED_QUEUE = os.getenv("RABBITMQ_FAILED_QUEUE", f"{RABBITMQ_QUEUE}.failed")
+RABBITMQ_RETRY_DELAY_MS = int(os.getenv("RABBITMQ_RETRY_DELAY_MS", "30000"))
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
+# Attempts are counted in our own header: x-death belongs to the broker, and
+# newer RabbitMQ releases don't trust copies of it republished by clients
+RETRY_COUNT_HEADER = "x-retry-count"
+# RABBITMQ_QUEUE is dead-lettered through a policy rather than queue arguments:
+# a policy applies to the existing durable queue, whereas changing its
+# arguments makes every declaration fail with PRECONDITION_FAILED. The policy
+# is set through the management API; see the README for the rabbitmqctl form
+RABBITMQ_MANAGEMENT_URL = os.getenv("RABBITMQ_MANAGEMENT_URL", f"http://{RABBITMQ_HOST}:15672")
+RABBITMQ_VHOST = os.getenv("RABBITMQ_VHOST", "/")
+RABBITMQ_DEAD_LETTER_POLICY = os.getenv("RABBITMQ_DEAD_LETTER_POLICY", f"{RABBITMQ_QUEUE}-dead-letter")
+# Set to false when the policy is managed outside the worker (rabbitmqctl)
+RABBITMQ_APPLY_POLICY = os.getenv("RABBITMQ_APPLY_POLICY", "true").lower() in ("1", "true", "yes")
+
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 MONGODB_DB = os.getenv("MONGODB_DB", "video_converter")
+MONGODB_POOL_SIZE = int(os.getenv("MONGODB_POOL_SIZE", "32"))
+# Optional: let MongoDB delete job documents this many seconds after their last update
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "0"))
 
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
@@ -38,67 +80,147 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "/tmp/outputs"))
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Consumer processes forked per container, conversions run in parallel per
+# process, and messages prefetched from RabbitMQ per process
+CPU_COUNT = os.cpu_count() or 1
+WORKER_PROCESSES = int(os.getenv("WORKERS", "1"))
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", str(max(1, CPU_COUNT // WORKER_PROCESSES))))
+# Consumer channels opened on the process's single RabbitMQ connection; the
+# batch size and prefetch below apply per channel
+CONSUMER_CHANNELS = max(1, int(os.getenv("CONSUMER_CHANNELS", "1")))
+CHANNEL_THREADS = max(1, WORKER_THREADS // CONSUMER_CHANNELS)
+# Completed jobs are acked in batches of ACK_BATCH_SIZE, or after
+# ACK_FLUSH_INTERVAL seconds; prefetch leaves room for a batch awaiting its ack
+ACK_BATCH_SIZE = int(os.getenv("ACK_BATCH_SIZE", str(CHANNEL_THREADS)))
+ACK_FLUSH_INTERVAL = float(os.getenv("ACK_FLUSH_INTERVAL", "1.0"))
+PREFETCH_COUNT = int(os.getenv("PREFETCH", str(CHANNEL_THREADS + ACK_BATCH_SIZE)))
+# Split the cores between concurrent ffmpeg processes to avoid oversubscription
+FFMPEG_THREADS = max(1, CPU_COUNT // (WORKER_PROCESSES * WORKER_THREADS))
+# Every conversion thread records its job in Postgres, and the pool raises
+# instead of waiting when it runs dry
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", str(WORKER_THREADS)))
+
+# Database connections
+mongo_client = None
+pg_pool = None
+client_init_lock = threading.Lock()
+
 
 def get_mongo_client():
-    """Get MongoDB database client."""
-    client = MongoClient(MONGODB_URI)
-    return client[MONGODB_DB]
+    """Get MongoDB database client, shared by all worker threads."""
+    global mongo_client
+    if mongo_client is None:
+        with client_init_lock:
+            if mongo_client is None:
+                mongo_client = MongoClient(MONGODB_URI, maxPoolSize=MONGODB_POOL_SIZE)
+    return mongo_client[MONGODB_DB]
 
 
+def get_postgres_pool():
+    """Get the shared PostgreSQL connection pool, creating it on first use."""
+    global pg_pool
+    if pg_pool is None:
+        with client_init_lock:
+            if pg_pool is None:
+                pg_pool = ThreadedConnectionPool(
+                    1,
+                    POSTGRES_POOL_SIZE,
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT,
+                    database=POSTGRES_DB,
+                    user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD
+                )
+    return pg_pool
+
+
+@contextmanager
 def get_postgres_conn():
-    """Get PostgreSQL connection."""
-    return psycopg2.connect(
-        host=POSTGRES_HOST,
-        port=POSTGRES_PORT,
-        database=POSTGRES_DB,
-        user=POSTGRES_USER,
-        password=POSTGRES_PASSWORD
-    )
+    """Borrow a PostgreSQL connection from the pool for the duration of the block."""
+    pool = get_postgres_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        # The pool rolls back any transaction left open by a failed block
+        pool.putconn(conn)
+
 
+def dumps_details(details: dict) -> str:
+    """Serialize request_logs details; naive datetimes are written as UTC ('...Z')."""
+    return orjson.dumps(details, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z).decode()
 
-def process_video(job_id: str, file_path: str, original_filename: str):
+
+def record_job_state(job_id: str, status: str, log_rows: list, audio_file_path: str = None,
+                     error: str = None):
+    """
+    Write the final job status and all buffered request logs in one transaction.
+
+    Args:
+        job_id: Unique job identifier
+        status: Terminal status ('completed' or 'failed')
+        log_rows: (job_id, action, details) tuples for request_logs
+        audio_file_path: Output path, only set for completed jobs
+        error: Failure reason, only set for failed jobs
+    """
+    with get_postgres_conn() as conn:
+        with conn.cursor() as cur:
+            if status == "completed":
+                cur.execute("""
+                    UPDATE conversion_jobs
+                    SET status = %s,
+                        audio_file_path = %s,
+                        completed_at = CURRENT_TIMESTAMP
+                    WHERE job_id = %s
+                """, (status, audio_file_path, job_id))
+            else:
+                cur.execute("""
+                    UPDATE conversion_jobs
+                    SET status = %s,
+                        error = %s
+                    WHERE job_id = %s
+                """, (status, error, job_id))
+
+            if log_rows:
+                execute_values(cur, """
+                    INSERT INTO request_logs (job_id, action, details)
+                    VALUES %s
+                """, log_rows)
+        conn.commit()
+
+
+def process_video(job_id: str, file_path: str, original_filename: str, final_attempt: bool = True):
     """
     Process a video file: convert to audio and update databases.
+
+    Status and log rows are buffered while the job runs and written once
+    the job reaches a terminal state: one MongoDB update and one
+    PostgreSQL transaction per job.
+
+    Transient errors (see is_transient) propagate so the message is retried,
+    unless this is the final attempt, in which case the job is marked failed.
     
     Args:
         job_id: Unique job identifier
         file_path: Path to input video file
         original_filename: Original filename for reference
+        final_attempt: Whether the message has used up its retries
     """
     db = get_mongo_client()
+    log_rows = [(job_id, "processing_started", dumps_details({
+        "file_path": file_path,
+        "timestamp": datetime.utcnow()
+    }))]
+    audio_file_path = None
+    error_msg = None
     
     try:
-        # Update status to processing
-        db.videos.update_one(
-            {"job_id": job_id},
-            {"$set": {"status": "processing", "updated_at": datetime.utcnow().isoformat()}}
-        )
-        
-        # Update PostgreSQL
-        conn = get_postgres_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE conversion_jobs
-            SET status = 'processing'
-            WHERE job_id = %s
-        """, (job_id,))
-        conn.commit()
-        
-        # Log processing start
-        cur.execute("""
-            INSERT INTO request_logs (job_id, action, details)
-            VALUES (%s, %s, %s)
-        """, (job_id, "processing_started", json.dumps({
-            "file_path": file_path,
-            "timestamp": datetime.utcnow().isoformat()
-        })))
-        conn.commit()
-        cur.close()
-        
-        # Check if input file exists
-        input_path = Path(file_path)
-        if not input_path.exists():
-            raise FileNotFoundError(f"Input file not found: {file_path}")
+        # One stat validates the input; the converter skips its own checks
+        input_path = os.path.abspath(file_path)
+        try:
+            input_stat = os.stat(input_path)
+        except FileNotFoundError:
+            raise ConversionError(f"Input file not found: {file_path}")
         
         # Generate output audio file path
         output_filename = f"{job_id}.mp3"
@@ -107,140 +229,247 @@ def process_video(job_id: str, file_path: str, original_filename: str):
         # Convert video to audio
         print(f"Converting {file_path} to {output_path}...")
         return_code, result_path = convert_to_audio(
-            str(input_path),
+            input_path,
             str(output_path),
             codec="mp3",
-            quality=2
+            quality=2,
+            threads=FFMPEG_THREADS,
+            copy_if_compatible=True,
+            skip_checks=True,
+            input_stat=input_stat
         )
         
         if return_code != 0:
             raise ConversionError(f"FFmpeg returned non-zero exit code: {return_code}")
         
         # Get output file size
-        output_size = Path(result_path).stat().st_size
-        
-        # Update MongoDB with success
-        db.videos.update_one(
-            {"job_id": job_id},
-            {"$set": {
-                "status": "completed",
-                "audio_file_path": str(output_path),
-                "audio_file_size": output_size,
-                "updated_at": datetime.utcnow().isoformat(),
-                "completed_at": datetime.utcnow().isoformat()
-            }}
-        )
+        output_size = os.stat(result_path).st_size
         
-        # Update PostgreSQL
-        conn = get_postgres_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE conversion_jobs
-            SET status = 'completed',
-                audio_file_path = %s,
-                completed_at = CURRENT_TIMESTAMP
-            WHERE job_id = %s
-        """, (str(output_path), job_id))
-        conn.commit()
-        
-        # Log completion
-        cur.execute("""
-            INSERT INTO request_logs (job_id, action, details)
-            VALUES (%s, %s, %s)
-        """, (job_id, "processing_completed", json.dumps({
-            "audio_file_path": str(output_path),
+        now = datetime.utcnow()
+        status = "completed"
+        # Compatible sources are stream-copied, so the extension may not be .mp3
+        audio_file_path = result_path
+        mongo_update = {
+            "status": status,
+            "audio_file_path": audio_file_path,
+            "audio_format": Path(audio_file_path).suffix.lstrip("."),
+            "audio_file_size": output_size,
+            "updated_at": now,
+            "completed_at": now
+        }
+        log_rows.append((job_id, "processing_completed", dumps_details({
+            "audio_file_path": audio_file_path,
             "audio_file_size": output_size,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now
         })))
-        conn.commit()
-        cur.close()
         
-        print(f"✓ Job {job_id} completed successfully. Audio saved to {output_path}")
+        print(f"✓ Job {job_id} completed successfully. Audio saved to {audio_file_path}")
         
     except ConversionError as e:
         error_msg = str(e)
         print(f"✗ Conversion error for job {job_id}: {error_msg}")
         
-        # Update MongoDB with error
-        db.videos.update_one(
-            {"job_id": job_id},
-            {"$set": {
-                "status": "failed",
-                "error": error_msg,
-                "updated_at": datetime.utcnow().isoformat()
-            }}
-        )
-        
-        # Update PostgreSQL
-        conn = get_postgres_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE conversion_jobs
-            SET status = 'failed'
-            WHERE job_id = %s
-        """, (job_id,))
-        conn.commit()
-        
-        cur.execute("""
-            INSERT INTO request_logs (job_id, action, details)
-            VALUES (%s, %s, %s)
-        """, (job_id, "processing_failed", json.dumps({
+        now = datetime.utcnow()
+        status = "failed"
+        mongo_update = {
+            "status": status,
+            "error": error_msg,
+            "updated_at": now
+        }
+        log_rows.append((job_id, "processing_failed", dumps_details({
             "error": error_msg,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now
         })))
-        conn.commit()
-        cur.close()
         
     except Exception as e:
+        if is_transient(e) and not final_attempt:
+            raise
         error_msg = str(e)
         print(f"✗ Unexpected error for job {job_id}: {error_msg}")
         
-        # Update databases with error
-        db.videos.update_one(
-            {"job_id": job_id},
-            {"$set": {
-                "status": "failed",
-                "error": error_msg,
-                "updated_at": datetime.utcnow().isoformat()
-            }}
-        )
-        
-        conn = get_postgres_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE conversion_jobs
-            SET status = 'failed'
-            WHERE job_id = %s
-        """, (job_id,))
-        conn.commit()
-        cur.close()
+        status = "failed"
+        mongo_update = {
+            "status": status,
+            "error": error_msg,
+            "updated_at": datetime.utcnow()
+        }
+    
+    # The upload service writes the metadata document unacknowledged, so it
+    # may be missing; upsert so /download never disagrees with /job
+    db.videos.update_one({"job_id": job_id}, {"$set": mongo_update}, upsert=True)
+    record_job_state(job_id, status, log_rows, audio_file_path, error_msg)
+
+
+def run_job(job_id: str, file_path: str, original_filename: str, final_attempt: bool):
+    """Run a job on an executor thread. Exceptions propagate to the future."""
+    print(f"Received job: {job_id} for file: {file_path}")
+    process_video(job_id, file_path, original_filename, final_attempt)
+
+
+def retry_count(properties) -> int:
+    """Number of times this message already went through the retry queue."""
+    try:
+        return int((properties.headers or {}).get(RETRY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errors worth retrying: lost database connections and I/O failures such as a full disk."""
+    return isinstance(error, (
+        pymongo_errors.ConnectionFailure,
+        psycopg2.OperationalError,
+        OSError,
+    ))
 
 
-def callback(ch, method, properties, body):
+def retry_message(ch, delivery_tag, properties, body):
+    """Park a message in the retry queue; it returns to the work queue after the TTL."""
+    retry_properties = copy.copy(properties)
+    headers = dict(properties.headers or {})
+    headers.pop("x-death", None)
+    headers[RETRY_COUNT_HEADER] = retry_count(properties) + 1
+    retry_properties.headers = headers
+    ch.basic_publish(
+        exchange="",
+        routing_key=RABBITMQ_RETRY_QUEUE,
+        body=body,
+        properties=retry_properties
+    )
+    ch.basic_ack(delivery_tag=delivery_tag)
+
+
+def settle_message(batcher, method, properties, body, future):
     """
-    RabbitMQ callback function that processes incoming messages.
+    Done-callback for a job future: ack, retry or dead-letter its message.
+
+    pika is not thread-safe, so settling is scheduled onto the connection's
+    I/O thread rather than done from the executor thread.
     """
+    if future.cancelled():
+        # Cancelled by executor shutdown on reconnect; the broker redelivers it
+        return
+    ch = batcher.channel
+    delivery_tag = method.delivery_tag
+    error = future.exception()
+    if error is None:
+        settle = functools.partial(batcher.ack, delivery_tag)
+    else:
+        if is_transient(error) and retry_count(properties) < MAX_RETRIES:
+            print(f"Transient error processing message, retrying in {RABBITMQ_RETRY_DELAY_MS}ms: {error}")
+            reject = functools.partial(retry_message, ch, delivery_tag, properties, body)
+        else:
+            print(f"Error processing message, dead-lettering: {error}")
+            reject = functools.partial(ch.basic_nack, delivery_tag=delivery_tag, requeue=False)
+
+        def settle():
+            reject()
+            batcher.settled(delivery_tag)
+
     try:
-        message = json.loads(body.decode('utf-8'))
-        job_id = message.get("job_id")
-        file_path = message.get("file_path")
-        original_filename = message.get("original_filename", "unknown")
-        
-        print(f"Received job: {job_id} for file: {file_path}")
-        
-        # Process the video
-        process_video(job_id, file_path, original_filename)
-        
-        # Acknowledge message
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        
-    except json.JSONDecodeError as e:
+        batcher.connection.add_callback_threadsafe(settle)
+    except Exception as e:
+        # Connection already gone; the broker will redeliver the message
+        print(f"Could not settle message {delivery_tag}: {e}")
+
+
+def callback(executor, batcher, ch, method, properties, body):
+    """
+    RabbitMQ callback function that hands incoming messages to the executor.
+    """
+    try:
+        message = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
         print(f"Error decoding message: {e}")
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        return
+
+    # Anything escaping this callback would end the whole session, and the
+    # broker would redeliver the same message, so malformed jobs are
+    # dead-lettered here
+    if not isinstance(message, dict) or not message.get("job_id") or not message.get("file_path"):
+        print(f"Invalid job message, dead-lettering: {body[:200]!r}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        return
+
+    batcher.started(method.delivery_tag)
+    try:
+        future = executor.submit(
+            run_job,
+            message["job_id"],
+            message["file_path"],
+            message.get("original_filename", "unknown"),
+            retry_count(properties) >= MAX_RETRIES
+        )
     except Exception as e:
-        print(f"Error processing message: {e}")
-        # Reject and requeue the message
+        # Executor already shutting down; let another consumer take the job
+        print(f"Could not start job {message['job_id']}: {e}")
+        batcher.settled(method.delivery_tag)
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        return
+    future.add_done_callback(
+        functools.partial(settle_message, batcher, method, properties, body)
+    )
+
+
+def declare_queues(channel):
+    """Declare the work queue with its retry queue and dead-letter (failed) queue."""
+    channel.exchange_declare(
+        exchange=RABBITMQ_DEAD_LETTER_EXCHANGE,
+        exchange_type="direct",
+        durable=True
+    )
+    channel.queue_declare(queue=RABBITMQ_FAILED_QUEUE, durable=True)
+    channel.queue_bind(
+        queue=RABBITMQ_FAILED_QUEUE,
+        exchange=RABBITMQ_DEAD_LETTER_EXCHANGE,
+        routing_key="failed"
+    )
+    channel.queue_declare(
+        queue=RABBITMQ_RETRY_QUEUE,
+        durable=True,
+        arguments={
+            "x-message-ttl": RABBITMQ_RETRY_DELAY_MS,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": RABBITMQ_QUEUE,
+        }
+    )
+    channel.queue_declare(queue=RABBITMQ_QUEUE, durable=True)
+
+
+def apply_dead_letter_policy():
+    """
+    Set the policy that dead-letters RABBITMQ_QUEUE into RABBITMQ_FAILED_QUEUE.
+
+    Raises:
+      RuntimeError if the management API is unreachable or refuses the policy
+      (e.g. the user lacks the policymaker tag).
+    """
+    url = "{}/api/policies/{}/{}".format(
+        RABBITMQ_MANAGEMENT_URL.rstrip("/"),
+        urllib.parse.quote(RABBITMQ_VHOST, safe=""),
+        urllib.parse.quote(RABBITMQ_DEAD_LETTER_POLICY, safe="")
+    )
+    policy = {
+        "pattern": f"^{re.escape(RABBITMQ_QUEUE)}$",
+        "apply-to": "queues",
+        "definition": {
+            "dead-letter-exchange": RABBITMQ_DEAD_LETTER_EXCHANGE,
+            "dead-letter-routing-key": "failed",
+        },
+    }
+    credentials = base64.b64encode(f"{RABBITMQ_USER}:{RABBITMQ_PASSWORD}".encode()).decode()
+    request = urllib.request.Request(
+        url,
+        data=orjson.dumps(policy),
+        method="PUT",
+        headers={"Content-Type": "application/json", "Authorization": f"Basic {credentials}"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+    except (urllib.error.URLError, OSError) as e:
+        raise RuntimeError(f"Could not apply dead-letter policy '{RABBITMQ_DEAD_LETTER_POLICY}': {e}") from e
 
 
 def start_consumer():
@@ -257,27 +486,59 @@ def start_consumer():
     )
 
     connection = pika.BlockingConnection(params)
-    channel = connection.channel()
+    try:
+        setup_channel = connection.channel()
+        declare_queues(setup_channel)
+        setup_channel.close()
+        # Without the policy a dead-lettered job would be silently dropped, so
+        # don't consume until it is in place; main() retries with backoff
+        if RABBITMQ_APPLY_POLICY:
+            apply_dead_letter_policy()
+    except Exception:
+        connection.close()
+        raise
 
-    # Declare queue as durable
-    channel.queue_declare(queue=RABBITMQ_QUEUE, durable=True)
+    executor = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+    try:
+        # All channels share this connection's socket and heartbeat; each gets
+        # its own prefetch window and ack batcher
+        for _ in range(CONSUMER_CHANNELS):
+            channel = connection.channel()
+            # Keep enough messages in flight to feed this channel's share of threads
+            channel.basic_qos(prefetch_count=PREFETCH_COUNT)
+            batcher = AckBatcher(connection, channel, ACK_BATCH_SIZE, ACK_FLUSH_INTERVAL)
+            channel.basic_consume(
+                queue=RABBITMQ_QUEUE,
+                on_message_callback=functools.partial(callback, executor, batcher)
+            )
 
-    # Process one message at a time
-    channel.basic_qos(prefetch_count=1)
+        print(f"Waiting for messages in queue '{RABBITMQ_QUEUE}' "
+              f"({WORKER_THREADS} threads, {CONSUMER_CHANNELS} channels, prefetch {PREFETCH_COUNT}). "
+              f"To exit press CTRL+C")
+        # Dispatches deliveries and thread-safe ack callbacks for every channel
+        while True:
+            connection.process_data_events(time_limit=None)
+    finally:
+        # Unacked messages of a dead session are redelivered by the broker, so
+        # let running conversions finish before main() reconnects; otherwise a
+        # redelivered job would run twice at once, writing the same output file
+        executor.shutdown(wait=True, cancel_futures=True)
 
-    # Set up consumer
-    channel.basic_consume(
-        queue=RABBITMQ_QUEUE,
-        on_message_callback=callback
-    )
 
-    print(f"Waiting for messages in queue '{RABBITMQ_QUEUE}'. To exit press CTRL+C")
-    channel.start_consuming()
+def ensure_ttl_index():
+    """Create the updated_at TTL index when JOB_TTL_SECONDS is set."""
+    if JOB_TTL_SECONDS <= 0:
+        return
+    try:
+        get_mongo_client().videos.create_index("updated_at", expireAfterSeconds=JOB_TTL_SECONDS)
+    except Exception as e:
+        print(f"Warning: Could not create updated_at TTL index: {e}")
 
 
 def main():
     """Main loop that auto-reconnects to RabbitMQ on failures with backoff."""
     print("Starting Converter Worker...")
+    ensure_ttl_index()
     backoff_seconds = 2
     max_backoff = 30
 
@@ -302,6 +563,41 @@ def main():
             continue
 
 
+def run_workers():
+    """
+    Fork WORKER_PROCESSES consumers sharing the parent's imported code pages.
+
+    Database clients are created lazily, so every child opens its own
+    Mongo/Postgres/RabbitMQ connections after the fork.
+    """
+    if WORKER_PROCESSES <= 1:
+        main()
+        return
+
+    multiprocessing.set_start_method("fork")
+    procs = [
+        multiprocessing.Process(target=main, name=f"converter-worker-{i}")
+        for i in range(WORKER_PROCESSES)
+    ]
+    for proc in procs:
+        proc.start()
+    print(f"Started {len(procs)} worker processes")
+
+    def stop_children(signum, frame):
+        for proc in procs:
+            proc.terminate()
+
+    signal.signal(signal.SIGTERM, stop_children)
+
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        # Children received the same SIGINT and shut down on their own
+        for proc in procs:
+            proc.join()
+
+
 if __name__ == "__main__":
-    main()
+    run_workers()
 
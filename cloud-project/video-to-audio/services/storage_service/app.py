@@ -3,23 +3,109 @@ Storage Service - API for retrieving converted audio files
 """
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pathlib import Path
+import asyncio
 import os
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from cachetools import TTLCache
 from typing import Optional
 
 app = FastAPI(title="Storage Service", version="1.0.0")
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 MONGODB_DB = os.getenv("MONGODB_DB", "video_converter")
+MONGODB_POOL_SIZE = int(os.getenv("MONGODB_POOL_SIZE", "32"))
 OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "/tmp/outputs"))
 
+# The converter stream-copies MP3/AAC sources, so outputs are .mp3 or .m4a
+AUDIO_MEDIA_TYPES = {"mp3": "audio/mpeg", "m4a": "audio/mp4"}
+
+# When running behind a reverse proxy, let it send the file body itself:
+#   "nginx"  -> X-Accel-Redirect to PROXY_PROTECTED_PREFIX (an internal location aliasing OUTPUT_DIR)
+#   "apache" -> X-Sendfile with the absolute file path (mod_xsendfile)
+# Unset: stream the file from Python with FileResponse.
+REQUEST_FORWARDED_VIA_PROXY = os.getenv("REQUEST_FORWARDED_VIA_PROXY", "").lower()
+PROXY_PROTECTED_PREFIX = os.getenv("PROXY_PROTECTED_PREFIX", "/_protected/")
+
+# Completed jobs never change, so their lookups are cached per (job_id, projection)
+JOB_CACHE_SIZE = int(os.getenv("JOB_CACHE_SIZE", "10000"))
+JOB_CACHE_TTL = int(os.getenv("JOB_CACHE_TTL", "300"))
+job_cache = TTLCache(maxsize=JOB_CACHE_SIZE, ttl=JOB_CACHE_TTL)
+
+# Fields download_audio needs; everything else stays on the server
+DOWNLOAD_PROJECTION = {"_id": 0, "status": 1, "audio_file_path": 1, "audio_file_size": 1, "audio_format": 1}
+INFO_PROJECTION = {"_id": 0}
+
+# Database connections
+mongo_client = None
+
 
 def get_mongo_client():
-    """Get MongoDB database client."""
-    client = MongoClient(MONGODB_URI)
-    return client[MONGODB_DB]
+    """Get the async MongoDB database client, reusing one pooled client across requests."""
+    global mongo_client
+    if mongo_client is None:
+        mongo_client = AsyncIOMotorClient(MONGODB_URI, maxPoolSize=MONGODB_POOL_SIZE)
+    return mongo_client[MONGODB_DB]
+
+
+async def find_job(job_id: str, projection: dict) -> Optional[dict]:
+    """
+    Look up a job document, serving completed jobs from the TTL cache.
+    
+    Args:
+        job_id: The job identifier
+        projection: MongoDB projection applied on a cache miss
+        
+    Returns:
+        The (projected) job document, or None if the job doesn't exist
+    """
+    key = (job_id, tuple(projection))
+    job = job_cache.get(key)
+    if job is not None:
+        return job
+    
+    db = get_mongo_client()
+    job = await db.videos.find_one({"job_id": job_id}, projection=projection)
+    if job and job.get("status") == "completed":
+        job_cache[key] = job
+    return job
+
+
+@app.on_event("startup")
+async def startup():
+    """Make sure job lookups are index seeks."""
+    try:
+        await get_mongo_client().videos.create_index("job_id", unique=True)
+    except Exception as e:
+        print(f"Warning: Could not create job_id index: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close database connections."""
+    if mongo_client is not None:
+        mongo_client.close()
+
+
+def stat_file(path: Path) -> Optional[os.stat_result]:
+    """Stat a file once for both existence and size; None if it doesn't exist."""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def offloaded_response(header: str, location: str, filename: str, media_type: str) -> Response:
+    """Empty response telling the reverse proxy which file to send (zero-copy sendfile)."""
+    return Response(
+        status_code=200,
+        media_type=media_type,
+        headers={
+            header: location,
+            "Content-Disposition": f'attachment; filename="{filename}"'
+        }
+    )
 
 
 @app.get("/health")
@@ -40,8 +126,18 @@ async def download_audio(job_id: str):
         Audio file download
     """
     try:
-        db = get_mongo_client()
-        job = db.videos.find_one({"job_id": job_id})
+        # The worker writes OUTPUT_DIR/{job_id}.mp3 unless it stream-copied
+        # AAC, so stat that path while the job lookup is in flight
+        default_path = OUTPUT_DIR / f"{job_id}.mp3"
+        job, default_stat = await asyncio.gather(
+            find_job(job_id, DOWNLOAD_PROJECTION),
+            asyncio.to_thread(stat_file, default_path)
+        )
+        
+        async def stat_candidate(path: Path) -> Optional[os.stat_result]:
+            if path == default_path:
+                return default_stat
+            return await asyncio.to_thread(stat_file, path)
         
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
@@ -54,24 +150,39 @@ async def download_audio(job_id: str):
         
         audio_path = job.get("audio_file_path")
         file_path = None
+        file_stat = None
         if audio_path:
             candidate = Path(audio_path)
-            if candidate.exists():
+            file_stat = await stat_candidate(candidate)
+            if file_stat is not None:
                 file_path = candidate
         
-        # Fallback: if stored path is missing or not found, try OUTPUT_DIR/{job_id}.mp3
+        audio_format = job.get("audio_format", "mp3")
+        
+        # Fallback: if stored path is missing or not found, try OUTPUT_DIR/{job_id}.{format}
         if file_path is None:
-            fallback = OUTPUT_DIR / f"{job_id}.mp3"
-            if fallback.exists():
+            fallback = OUTPUT_DIR / f"{job_id}.{audio_format}"
+            file_stat = await stat_candidate(fallback)
+            if file_stat is not None:
                 file_path = fallback
         
         if file_path is None:
             raise HTTPException(status_code=404, detail="Audio file not found on disk")
         
+        filename = f"{job_id}.{audio_format}"
+        media_type = AUDIO_MEDIA_TYPES.get(audio_format, "application/octet-stream")
+        
+        if REQUEST_FORWARDED_VIA_PROXY == "nginx":
+            return offloaded_response("X-Accel-Redirect", f"{PROXY_PROTECTED_PREFIX}{file_path.name}", filename, media_type)
+        if REQUEST_FORWARDED_VIA_PROXY == "apache":
+            return offloaded_response("X-Sendfile", str(file_path.resolve()), filename, media_type)
+        
+        # Passing our stat result stops Starlette from stat-ing the file again
         return FileResponse(
             path=str(file_path),
-            filename=f"{job_id}.mp3",
-            media_type="audio/mpeg"
+            filename=filename,
+            media_type=media_type,
+            stat_result=file_stat
         )
         
     except HTTPException:
@@ -84,13 +195,11 @@ async def download_audio(job_id: str):
 async def get_job_info(job_id: str):
     """Get information about a conversion job."""
     try:
-        db = get_mongo_client()
-        job = db.videos.find_one({"job_id": job_id})
+        job = await find_job(job_id, INFO_PROJECTION)
         
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        job.pop("_id", None)
         return job
         
     except HTTPException:
@@ -101,5 +210,12 @@ async def get_job_info(job_id: str):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8001,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    )
 
@@ -3,23 +3,30 @@ Upload Service - FastAPI microservice that handles video file uploads
 and queues conversion jobs in RabbitMQ.
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 from typing import Optional
-import pika
+import aio_pika
+from aio_pika.pool import Pool
+import asyncio
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
-import json
-from pymongo import MongoClient
-import psycopg2
-from psycopg2.extras import RealDictCursor
-
-app = FastAPI(title="Video Upload Service", version="1.0.0")
+import orjson
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
+from psycopg2.extensions import connection as PostgresConnection
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import RealDictCursor, Json
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from multipart.multipart import MultipartParser, parse_options_header
+
+app = FastAPI(title="Video Upload Service", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Static/Template setup for simple web UI
 BASE_DIR = Path(__file__).parent
@@ -36,6 +43,15 @@ RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", "5672"))
 RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
 RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "guest")
 RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE", "video_conversion_queue")
+RABBITMQ_CHANNEL_POOL_SIZE = int(os.getenv("RABBITMQ_CHANNEL_POOL_SIZE", "16"))
+# Jobs waiting for the background publisher, and how long shutdown waits for
+# them to be published before giving up
+PUBLISH_QUEUE_SIZE = int(os.getenv("PUBLISH_QUEUE_SIZE", "10000"))
+PUBLISH_DRAIN_TIMEOUT = float(os.getenv("PUBLISH_DRAIN_TIMEOUT", "10"))
+# Jobs are published in batches of up to PUBLISH_BATCH_SIZE, collected over
+# PUBLISH_BATCH_WINDOW seconds, sharing one round of publisher confirms
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "256"))
+PUBLISH_BATCH_WINDOW = float(os.getenv("PUBLISH_BATCH_WINDOW", "0.005"))
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 MONGODB_DB = os.getenv("MONGODB_DB", "video_converter")
@@ -45,74 +61,590 @@ POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
 POSTGRES_DB = os.getenv("POSTGRES_DB", "videodb")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
+# Connections kept open per uvicorn worker process; size the maximum to the
+# number of requests a process handles concurrently
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "4"))
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", "20"))
 
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/tmp/uploads"))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_DIR_STR = str(UPLOAD_DIR)
+# Largest upload request body accepted, checked from Content-Length up front
+# and enforced while the body streams in
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(2 << 30)))
+# Chunks are gathered up to this many bytes and written with one writev call
+UPLOAD_WRITE_BATCH_SIZE = int(os.getenv("UPLOAD_WRITE_BATCH_SIZE", str(8 << 20)))
+# Most iovecs a single writev call accepts (Linux IOV_MAX)
+WRITEV_MAX_CHUNKS = 1024
+# Largest non-file form field (e.g. user_id) kept in memory
+MAX_FIELD_BYTES = 64 << 10
+
+# Advisory lock key held while one worker process creates the schema
+SCHEMA_LOCK_ID = 918273645
 
 # Database connections
 mongo_client = None
-pg_conn = None
+pg_pool = None
+# Postgres calls run on their own threads, at most one per pooled connection:
+# ThreadedConnectionPool raises instead of waiting when it runs dry, and the
+# default to_thread executor can have more threads than the pool
+pg_executor = ThreadPoolExecutor(max_workers=POSTGRES_POOL_SIZE, thread_name_prefix="postgres")
+
+# Long-lived RabbitMQ publisher connection and its pool of open channels
+rabbit_connection = None
+rabbit_channels = None
+
+# Jobs handed off by upload_video and the task publishing them
+publish_queue = None
+publisher_task = None
 
 
 def get_mongo_client():
+    """Get the async MongoDB database client, reusing one pooled client across requests."""
     global mongo_client
     if mongo_client is None:
-        mongo_client = MongoClient(MONGODB_URI)
+        mongo_client = AsyncIOMotorClient(MONGODB_URI)
     return mongo_client[MONGODB_DB]
 
 
-def get_postgres_conn():
-    global pg_conn
-    if pg_conn is None or pg_conn.closed:
-        pg_conn = psycopg2.connect(
+class PreparedConnection(PostgresConnection):
+    """Pooled connection that remembers whether the upload insert is prepared on it."""
+    upload_insert_prepared = False
+
+
+def get_postgres_pool():
+    global pg_pool
+    if pg_pool is None:
+        pg_pool = ThreadedConnectionPool(
+            min(POSTGRES_POOL_MIN_SIZE, POSTGRES_POOL_SIZE),
+            POSTGRES_POOL_SIZE,
+            connection_factory=PreparedConnection,
             host=POSTGRES_HOST,
             port=POSTGRES_PORT,
             database=POSTGRES_DB,
             user=POSTGRES_USER,
             password=POSTGRES_PASSWORD
         )
-    return pg_conn
+    return pg_pool
 
 
-@app.on_event("startup")
-async def startup():
-    """Initialize database connections and create tables if needed."""
+async def run_postgres(func, *args):
+    """Run a blocking Postgres call on pg_executor."""
+    return await asyncio.get_running_loop().run_in_executor(pg_executor, func, *args)
+
+
+@contextmanager
+def get_postgres_conn():
+    """Borrow a PostgreSQL connection from the pool for the duration of the block."""
+    pool = get_postgres_pool()
+    conn = pool.getconn()
     try:
-        # Initialize PostgreSQL schema
-        conn = get_postgres_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS conversion_jobs (
-                job_id VARCHAR(255) PRIMARY KEY,
-                user_id VARCHAR(255),
-                original_filename VARCHAR(255),
-                file_path TEXT,
-                status VARCHAR(50),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP,
-                audio_file_path TEXT
+        yield conn
+    finally:
+        # The pool rolls back any transaction left open by a failed block
+        pool.putconn(conn)
+
+
+def write_chunks(fd: int, chunks: list):
+    """Write the gathered chunks to fd, resuming after any partial writev."""
+    while chunks:
+        written = os.writev(fd, chunks[:WRITEV_MAX_CHUNKS])
+        while chunks and written >= len(chunks[0]):
+            written -= len(chunks[0])
+            chunks.pop(0)
+        if written:
+            chunks[0] = memoryview(chunks[0])[written:]
+
+
+class UploadStreamParser:
+    """
+    Parse a multipart/form-data upload as the request body streams in.
+    
+    The "file" part is written straight to its final path in UPLOAD_DIR,
+    instead of Starlette spooling it to a temporary file that is then copied
+    there. Other form fields are small and kept in memory.
+    """
+    
+    def __init__(self, boundary: bytes, job_id: str):
+        self.job_id = job_id
+        self.fields = {}
+        self.filename = None
+        self.content_type = None
+        self.file_path = None
+        # Counted as the file part streams in: the request's Content-Length
+        # covers the whole multipart body (boundaries, headers, other fields)
+        self.file_size = 0
+        self.fd = None
+        self.pending = []
+        self.pending_size = 0
+        self.headers = {}
+        self.header_field = b""
+        self.header_value = b""
+        self.part_name = None
+        self.part_is_file = False
+        self.field_data = bytearray()
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        })
+    
+    def on_part_begin(self):
+        self.headers = {}
+        self.part_name = None
+        self.part_is_file = False
+        self.field_data = bytearray()
+    
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+    
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+    
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b""
+        self.header_value = b""
+    
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        self.part_name = options.get(b"name", b"").decode("utf-8")
+        if self.part_name != "file" or b"filename" not in options:
+            return
+        if self.file_path is not None:
+            raise HTTPException(status_code=400, detail="Only one file may be uploaded.")
+        
+        # Validate file type before any of its data is written
+        content_type = self.headers.get(b"content-type", b"").decode("latin-1")
+        if not content_type.startswith("video/"):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid file type. Please upload a video file."
             )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS request_logs (
-                id SERIAL PRIMARY KEY,
-                job_id VARCHAR(255),
-                action VARCHAR(100),
-                details JSONB,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        self.part_is_file = True
+        self.filename = options[b"filename"].decode("utf-8")
+        self.content_type = content_type
+        file_extension = os.path.splitext(self.filename)[1]
+        self.file_path = os.path.join(UPLOAD_DIR_STR, f"{self.job_id}{file_extension}")
+        self.fd = os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.part_is_file:
+            self.pending.append(data[start:end])
+            self.pending_size += end - start
+            self.file_size += end - start
+        else:
+            self.field_data += data[start:end]
+            if len(self.field_data) > MAX_FIELD_BYTES:
+                raise HTTPException(status_code=400, detail=f"Form field '{self.part_name}' is too large.")
+    
+    def on_part_end(self):
+        if not self.part_is_file and self.part_name:
+            self.fields[self.part_name] = self.field_data.decode("utf-8")
+    
+    async def parse(self, request: Request):
+        """Feed the request body through the parser, writing file data in batches."""
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Upload is too large.")
+            self.parser.write(chunk)
+            if self.pending_size >= UPLOAD_WRITE_BATCH_SIZE:
+                await self.flush()
+        self.parser.finalize()
+        await self.flush()
+    
+    async def flush(self):
+        if self.pending:
+            chunks = self.pending
+            self.pending = []
+            self.pending_size = 0
+            await asyncio.to_thread(write_chunks, self.fd, chunks)
+    
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def dumps_details(details: dict) -> str:
+    """Serialize request_logs details with orjson for psycopg2's Json adapter."""
+    return orjson.dumps(details).decode()
+
+
+# Fused job + request log insert, prepared on each pooled connection
+PREPARE_UPLOAD_INSERT = """
+    PREPARE insert_upload_job (VARCHAR, VARCHAR, VARCHAR, TEXT, VARCHAR, VARCHAR, JSONB) AS
+    WITH job AS (
+        INSERT INTO conversion_jobs (job_id, user_id, original_filename, file_path, status)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING job_id
+    )
+    INSERT INTO request_logs (job_id, action, details)
+    SELECT job_id, $6, $7 FROM job
+"""
+
+
+def record_upload_job(job_id: str, user_id: Optional[str], filename: str, file_path: str,
+                      file_size: int, content_type: str):
+    """Store the job and log the upload request in PostgreSQL with a single statement."""
+    with get_postgres_conn() as conn:
+        with conn.cursor() as cur:
+            if not conn.upload_insert_prepared:
+                # Parse and plan once per connection; committed straight away
+                # so it outlives any later transaction that rolls back
+                cur.execute(PREPARE_UPLOAD_INSERT)
+                conn.commit()
+                conn.upload_insert_prepared = True
+            cur.execute(
+                "EXECUTE insert_upload_job (%s, %s, %s, %s, %s, %s, %s)",
+                (job_id, user_id or "anonymous", filename, file_path, "queued",
+                 "upload", Json({
+                     "filename": filename,
+                     "file_size": file_size,
+                     "content_type": content_type
+                 }, dumps=dumps_details))
             )
-        """)
+        conn.commit()
+
+
+def record_job_failure(job_id: str, error: str):
+    """Set a job's status to failed in PostgreSQL, keeping the error for status lookups."""
+    with get_postgres_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE conversion_jobs
+                SET status = 'failed', error = %s
+                WHERE job_id = %s
+            """, (error, job_id))
+        conn.commit()
+
+
+def mark_jobs_published(job_ids: list):
+    """Record that RabbitMQ confirmed these jobs, so startup doesn't requeue them."""
+    with get_postgres_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE conversion_jobs
+                SET published_at = CURRENT_TIMESTAMP
+                WHERE job_id = ANY(%s)
+            """, (job_ids,))
+        conn.commit()
+
+
+def claim_unpublished_jobs() -> list:
+    """
+    Claim queued jobs that never reached RabbitMQ, e.g. because the process
+    holding them in publish_queue crashed or timed out draining at shutdown.
+    
+    Claiming sets published_at in the same statement, so with several uvicorn
+    workers starting at once each job is returned to only one of them.
+    """
+    with get_postgres_conn() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                UPDATE conversion_jobs
+                SET published_at = CURRENT_TIMESTAMP
+                WHERE status = 'queued' AND published_at IS NULL
+                RETURNING job_id, file_path, original_filename, user_id
+            """)
+            jobs = cur.fetchall()
+        conn.commit()
+    return jobs
+
+
+def fetch_recent_jobs(limit: int, skip: int) -> list:
+    """Most recently created jobs first, walking idx_jobs_created_at."""
+    with get_postgres_conn() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT job_id, user_id, original_filename, file_path, status,
+                       created_at, completed_at, audio_file_path, error
+                FROM conversion_jobs
+                ORDER BY created_at DESC
+                LIMIT %s OFFSET %s
+            """, (limit, skip))
+            return cur.fetchall()
+
+
+def estimate_job_count() -> int:
+    """Planner row estimate for conversion_jobs, instead of a full COUNT(*)."""
+    with get_postgres_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'conversion_jobs'::regclass")
+            return max(0, cur.fetchone()[0])
+
+
+def fetch_job(job_id: str) -> Optional[dict]:
+    """Look up a job's current state by primary key; None if it doesn't exist."""
+    with get_postgres_conn() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT job_id, user_id, original_filename, file_path, status,
+                       created_at, completed_at, audio_file_path, error
+                FROM conversion_jobs
+                WHERE job_id = %s
+            """, (job_id,))
+            return cur.fetchone()
+
+
+async def open_rabbit_publisher():
+    """
+    Open the robust publisher connection and its channel pool.
+
+    The queue is declared once here instead of on every publish. It is
+    declared on a robust channel, which aio-pika re-declares it on after
+    re-establishing a dropped connection, before publishing resumes.
+    """
+    global rabbit_connection, rabbit_channels
+    connection = await aio_pika.connect_robust(
+        host=RABBITMQ_HOST,
+        port=RABBITMQ_PORT,
+        login=RABBITMQ_USER,
+        password=RABBITMQ_PASSWORD
+    )
+
+    async def open_channel():
+        return await connection.channel()
+
+    channels = Pool(open_channel, max_size=RABBITMQ_CHANNEL_POOL_SIZE)
+    try:
+        async with channels.acquire() as channel:
+            await channel.declare_queue(RABBITMQ_QUEUE, durable=True)
+    except Exception:
+        await connection.close()
+        raise
+    # Only hand the pool to publishers once the queue is known to exist, so a
+    # failed declare is retried by the next publish_jobs call
+    rabbit_connection = connection
+    rabbit_channels = channels
+
+
+async def close_rabbit_publisher():
+    global rabbit_connection, rabbit_channels
+    if rabbit_channels is not None:
+        await rabbit_channels.close()
+    if rabbit_connection is not None:
+        await rabbit_connection.close()
+    rabbit_connection = None
+    rabbit_channels = None
+
+
+async def publish_jobs(messages: list) -> list:
+    """
+    Publish a batch of jobs on one pooled channel.
+    
+    The publishes are pipelined and their publisher confirms awaited together,
+    instead of one network round trip per job.
+    
+    Returns:
+        One entry per message: None once confirmed, else the exception raised
+    """
+    if rabbit_channels is None:
+        await open_rabbit_publisher()
+    async with rabbit_channels.acquire() as channel:
+        exchange = channel.default_exchange
+        results = await asyncio.gather(*(
+            exchange.publish(
+                aio_pika.Message(
+                    body=orjson.dumps(message),
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    content_type="application/json"
+                ),
+                routing_key=RABBITMQ_QUEUE
+            )
+            for message in messages
+        ), return_exceptions=True)
+    return [result if isinstance(result, Exception) else None for result in results]
+
+
+async def mark_job_failed(job_id: str, error: str):
+    """Record a job that never reached the queue as failed in both stores."""
+    await asyncio.gather(
+        get_mongo_client().videos.update_one(
+            {"job_id": job_id},
+            {"$set": {"status": "failed", "error": error}}
+        ),
+        run_postgres(record_job_failure, job_id, error)
+    )
+
+
+async def fail_unqueued_job(message: dict, error: Exception):
+    """Mark a job that could not be published as failed and remove its upload."""
+    print(f"Warning: Could not queue job in RabbitMQ: {error}")
+    try:
+        await mark_job_failed(message["job_id"], str(error))
+    except Exception as e:
+        print(f"Warning: Could not mark job {message['job_id']} as failed: {e}")
+    try:
+        Path(message["file_path"]).unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Warning: Could not remove upload for job {message['job_id']}: {e}")
+
+
+async def run_publisher():
+    """Publish jobs handed off by upload_video so responses don't wait on RabbitMQ."""
+    while True:
+        batch = [await publish_queue.get()]
+        if publish_queue.qsize() < PUBLISH_BATCH_SIZE - 1:
+            # Let a burst of uploads accumulate into the same batch
+            await asyncio.sleep(PUBLISH_BATCH_WINDOW)
+        while len(batch) < PUBLISH_BATCH_SIZE and not publish_queue.empty():
+            batch.append(publish_queue.get_nowait())
+        
+        try:
+            try:
+                errors = await publish_jobs(batch)
+            except Exception as e:
+                errors = [e] * len(batch)
+            published = [message["job_id"] for message, error in zip(batch, errors) if error is None]
+            if published:
+                try:
+                    await run_postgres(mark_jobs_published, published)
+                except Exception as e:
+                    # Only means these jobs may be published again after a restart
+                    print(f"Warning: Could not mark {len(published)} jobs as published: {e}")
+            for message, error in zip(batch, errors):
+                if error is not None:
+                    # One bad message must not take down the only publisher
+                    try:
+                        await fail_unqueued_job(message, error)
+                    except Exception as e:
+                        print(f"Warning: Could not fail unqueued job {message.get('job_id')}: {e}")
+        finally:
+            for _ in batch:
+                publish_queue.task_done()
+
+
+async def requeue_unpublished_jobs():
+    """Hand jobs accepted by an earlier run but never published back to the publisher."""
+    for job in await run_postgres(claim_unpublished_jobs):
+        if not os.path.exists(job["file_path"]):
+            await mark_job_failed(job["job_id"], "upload was lost before the job was queued")
+            continue
+        await publish_queue.put(dict(job))
+        print(f"Requeued unpublished job {job['job_id']}")
+
+
+def start_publisher():
+    """Start the publisher task, restarting it if it ever exits unexpectedly."""
+    global publisher_task
+    publisher_task = asyncio.create_task(run_publisher())
+    publisher_task.add_done_callback(restart_publisher)
+
+
+def restart_publisher(task: asyncio.Task):
+    """Done-callback for publisher_task: log why it stopped and start a new one."""
+    if task.cancelled():
+        return
+    print(f"Warning: Job publisher stopped unexpectedly: {task.exception()!r}; restarting")
+    start_publisher()
+
+
+def init_postgres_schema():
+    """Create the PostgreSQL tables and indexes if they don't exist yet."""
+    # With several uvicorn workers only the one holding the lock runs the
+    # DDL, the rest start serving right away
+    with get_postgres_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+        if cur.fetchone()[0]:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS conversion_jobs (
+                    job_id VARCHAR(255) PRIMARY KEY,
+                    user_id VARCHAR(255),
+                    original_filename VARCHAR(255),
+                    file_path TEXT,
+                    status VARCHAR(50),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    completed_at TIMESTAMP,
+                    audio_file_path TEXT,
+                    error TEXT
+                )
+            """)
+            # Added after the table was first created; status lookups read it
+            cur.execute("ALTER TABLE conversion_jobs ADD COLUMN IF NOT EXISTS error TEXT")
+            # Set once RabbitMQ confirms the job; startup requeues queued jobs without it
+            cur.execute("ALTER TABLE conversion_jobs ADD COLUMN IF NOT EXISTS published_at TIMESTAMP")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS request_logs (
+                    id SERIAL PRIMARY KEY,
+                    job_id VARCHAR(255),
+                    action VARCHAR(100),
+                    details JSONB,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # job_id lookups use the primary key; recent-first listings use this
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_created_at
+                ON conversion_jobs (created_at DESC)
+            """)
+            # Keeps the startup requeue from scanning every finished job
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_unpublished
+                ON conversion_jobs (job_id)
+                WHERE status = 'queued' AND published_at IS NULL
+            """)
         conn.commit()
         cur.close()
+
+
+@app.on_event("startup")
+async def startup():
+    """Initialize database connections and create tables if needed."""
+    global publish_queue
+    try:
+        # Initialize PostgreSQL schema off the event loop
+        await run_postgres(init_postgres_schema)
+        
+        # Index the storage service's job lookup
+        db = get_mongo_client()
+        indexes = await db.videos.index_information()
+        if "job_id_1" not in indexes:
+            await db.videos.create_index("job_id", unique=True)
     except Exception as e:
         print(f"Warning: Could not initialize databases: {e}")
+    
+    try:
+        await open_rabbit_publisher()
+    except Exception as e:
+        # publish_jobs retries the connection on the first batch
+        print(f"Warning: Could not connect to RabbitMQ: {e}")
+    
+    publish_queue = asyncio.Queue(maxsize=PUBLISH_QUEUE_SIZE)
+    start_publisher()
+    
+    # A job only lives in publish_queue until RabbitMQ confirms it; pick up
+    # any that a crash or an unfinished shutdown drain left behind
+    try:
+        await requeue_unpublished_jobs()
+    except Exception as e:
+        print(f"Warning: Could not requeue unpublished jobs: {e}")
 
 
 @app.on_event("shutdown")
 async def shutdown():
-    """Close database connections."""
-    if pg_conn and not pg_conn.closed:
-        pg_conn.close()
+    """Close database and RabbitMQ connections."""
+    if publisher_task is not None:
+        # Give jobs already accepted a chance to reach RabbitMQ
+        try:
+            await asyncio.wait_for(publish_queue.join(), timeout=PUBLISH_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Warning: {publish_queue.qsize()} jobs were not published before shutdown; "
+                  f"they are requeued on the next startup")
+        publisher_task.cancel()
+    await close_rabbit_publisher()
+    if mongo_client is not None:
+        mongo_client.close()
+    if pg_pool is not None and not pg_pool.closed:
+        await run_postgres(pg_pool.closeall)
+    pg_executor.shutdown(wait=False)
 
 
 class UploadResponse(BaseModel):
@@ -127,14 +659,10 @@ async def health_check():
     return {"status": "healthy", "service": "upload_service"}
 
 
-@app.get("/", response_class=HTMLResponse)
-async def home(request: Request):
-    """Simple HTML upload form UI."""
-    # Inline minimal HTML if template file not present
-    index_html = (TEMPLATES_DIR / "index.html")
-    if index_html.exists():
-        return templates.TemplateResponse("index.html", {"request": request})
-    html = """
+# Inline minimal HTML used if the template file is not present; both are
+# resolved once at import rather than on every request
+INDEX_TEMPLATE_EXISTS = (TEMPLATES_DIR / "index.html").exists()
+INDEX_HTML_RESPONSE = HTMLResponse(content="""
     <!doctype html>
     <html lang=\"en\">
       <head>
@@ -230,126 +758,95 @@ async def home(request: Request):
         </script>
       </body>
     </html>
-    """
-    return HTMLResponse(content=html)
+    """)
+
+
+@app.get("/", response_class=HTMLResponse)
+async def home(request: Request):
+    """Simple HTML upload form UI."""
+    if INDEX_TEMPLATE_EXISTS:
+        return templates.TemplateResponse("index.html", {"request": request})
+    return INDEX_HTML_RESPONSE
 
 
 @app.post("/upload", response_model=UploadResponse)
-async def upload_video(
-    file: UploadFile = File(...),
-    user_id: Optional[str] = Form(None)
-):
+async def upload_video(request: Request):
     """
     Upload a video file and queue it for conversion.
     
+    The multipart form carries the video as "file" and an optional "user_id".
+    
     Returns:
         JSON response with job_id and status
     """
-    # Validate file type
-    if not file.content_type or not file.content_type.startswith("video/"):
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid file type. Please upload a video file."
-        )
+    # Reject from the headers alone, before reading any of the body
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload is too large.")
     
     # Generate unique job ID
-    job_id = str(uuid.uuid4())
-    
-    # Save uploaded file
-    file_extension = Path(file.filename).suffix
-    saved_filename = f"{job_id}{file_extension}"
-    file_path = UPLOAD_DIR / saved_filename
+    job_id = uuid.uuid4().hex
     
+    upload = UploadStreamParser(options[b"boundary"], job_id)
     try:
-        # Save file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Stream the file part straight to UPLOAD_DIR as it arrives; memory
+        # stays bounded by the write batch regardless of the video's size
+        try:
+            await upload.parse(request)
+        finally:
+            upload.close()
+        if upload.file_path is None:
+            raise HTTPException(status_code=400, detail="No video file uploaded.")
         
-        file_size = len(content)
+        file_path = upload.file_path
+        file_size = upload.file_size
+        filename = upload.filename
+        file_content_type = upload.content_type
+        user_id = upload.fields.get("user_id")
         
-        # Store metadata in MongoDB
+        # Store metadata in MongoDB and the job in PostgreSQL concurrently.
+        # The job itself lives in Postgres; Mongo only keeps what the storage
+        # service reads (status, later the audio fields), the upload details
+        # Postgres has no column for, and updated_at for the TTL index
         db = get_mongo_client()
         video_metadata = {
             "job_id": job_id,
-            "original_filename": file.filename,
-            "file_path": str(file_path),
             "file_size": file_size,
-            "content_type": file.content_type,
-            "user_id": user_id,
+            "content_type": file_content_type,
             "status": "queued",
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }
-        db.videos.insert_one(video_metadata)
-        
-        # Store job in PostgreSQL
-        conn = get_postgres_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO conversion_jobs (job_id, user_id, original_filename, file_path, status)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (job_id, user_id or "anonymous", file.filename, str(file_path), "queued"))
-        conn.commit()
-        cur.close()
-        
-        # Log request in PostgreSQL
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO request_logs (job_id, action, details)
-            VALUES (%s, %s, %s)
-        """, (job_id, "upload", json.dumps({
-            "filename": file.filename,
-            "file_size": file_size,
-            "content_type": file.content_type
-        })))
-        conn.commit()
-        cur.close()
+        # Postgres is the source of truth for job state; the Mongo metadata
+        # copy is written unacknowledged so it never holds up a response, and
+        # the converter worker upserts it if this insert is lost
+        await asyncio.gather(
+            db.videos.with_options(write_concern=WriteConcern(w=0)).insert_one(video_metadata),
+            run_postgres(
+                record_upload_job, job_id, user_id, filename, file_path,
+                file_size, file_content_type
+            )
+        )
         
-        # Queue job in RabbitMQ
+        # Hand the job to the background publisher; the job is already
+        # recorded as queued, so the response doesn't wait on RabbitMQ
+        message = {
+            "job_id": job_id,
+            "file_path": file_path,
+            "original_filename": filename,
+            "user_id": user_id
+        }
         try:
-            credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASSWORD)
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=RABBITMQ_HOST,
-                    port=RABBITMQ_PORT,
-                    credentials=credentials
-                )
-            )
-            channel = connection.channel()
-            
-            # Declare queue
-            channel.queue_declare(queue=RABBITMQ_QUEUE, durable=True)
-            
-            # Publish job
-            message = {
-                "job_id": job_id,
-                "file_path": str(file_path),
-                "original_filename": file.filename,
-                "user_id": user_id
-            }
-            
-            channel.basic_publish(
-                exchange="",
-                routing_key=RABBITMQ_QUEUE,
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # Make message persistent
-                )
-            )
-            
-            connection.close()
-            
-        except Exception as e:
-            print(f"Warning: Could not queue job in RabbitMQ: {e}")
+            publish_queue.put_nowait(message)
+        except asyncio.QueueFull:
+            print("Warning: Could not queue job in RabbitMQ: publish queue is full")
             # Update status to failed
-            db.videos.update_one(
-                {"job_id": job_id},
-                {"$set": {"status": "failed", "error": str(e)}}
-            )
+            await mark_job_failed(job_id, "publish queue is full")
             raise HTTPException(
-                status_code=500,
-                detail=f"Failed to queue job: {str(e)}"
+                status_code=503,
+                detail="Failed to queue job: publish queue is full"
             )
         
         return UploadResponse(
@@ -360,8 +857,10 @@ async def upload_video(
         
     except Exception as e:
         # Clean up on error
-        if file_path.exists():
-            file_path.unlink()
+        if upload.file_path is not None and os.path.exists(upload.file_path):
+            os.unlink(upload.file_path)
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
@@ -369,38 +868,49 @@ async def upload_video(
 async def get_job_status(job_id: str):
     """Get the status of a conversion job."""
     try:
-        # Check MongoDB
-        db = get_mongo_client()
-        job = db.videos.find_one({"job_id": job_id})
-        
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
-        
-        # Remove MongoDB ObjectId for JSON serialization
-        job.pop("_id", None)
-        
-        return job
+        # Postgres holds the authoritative job state; job_id is its primary key
+        job = await run_postgres(fetch_job, job_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
 
 
 @app.get("/jobs")
-async def list_jobs(limit: int = 10, skip: int = 0):
-    """List recent conversion jobs."""
+async def list_jobs(limit: int = 10, skip: int = 0, include_total: bool = False):
+    """
+    List recent conversion jobs.
+    
+    Args:
+        limit: Maximum number of jobs to return
+        skip: Number of jobs to skip
+        include_total: Also return an (estimated) total job count
+    """
     try:
-        db = get_mongo_client()
-        jobs = list(db.videos.find().sort("created_at", -1).skip(skip).limit(limit))
+        # Postgres is the source of truth for job state
+        response = {"jobs": await run_postgres(fetch_recent_jobs, limit, skip)}
         
-        # Remove ObjectId
-        for job in jobs:
-            job.pop("_id", None)
+        if include_total:
+            response["total"] = await run_postgres(estimate_job_count)
         
-        return {"jobs": jobs, "total": db.videos.count_documents({})}
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Each worker process gets its own Postgres pool, Mongo client and
+    # RabbitMQ publisher; size POSTGRES_POOL_SIZE per process
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    )
 
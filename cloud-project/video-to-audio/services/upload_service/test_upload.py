@@ -0,0 +1,131 @@
+# services/upload_service/test_upload.py
+import asyncio
+import importlib.util
+import os
+from pathlib import Path
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+# Loaded by path: the top-level app/ package would shadow "import app"
+spec = importlib.util.spec_from_file_location("upload_app", Path(__file__).with_name("app.py"))
+upload_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(upload_app)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted = []
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def insert_one(self, document):
+        self.inserted.append(document)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.videos = FakeCollection()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Upload service with the databases faked out and uploads written to tmp_path."""
+    monkeypatch.setattr(upload_app, "UPLOAD_DIR_STR", str(tmp_path))
+    # Small batches so a multi-megabyte upload goes through several writev calls
+    monkeypatch.setattr(upload_app, "UPLOAD_WRITE_BATCH_SIZE", 64 << 10)
+    db = FakeDatabase()
+    monkeypatch.setattr(upload_app, "get_mongo_client", lambda: db)
+    jobs = []
+
+    async def run_postgres(func, *args):
+        jobs.append((func.__name__,) + args)
+
+    monkeypatch.setattr(upload_app, "run_postgres", run_postgres)
+    monkeypatch.setattr(upload_app, "publish_queue", asyncio.Queue())
+    # Not used as a context manager, so startup doesn't connect to anything
+    test_client = TestClient(upload_app.app)
+    test_client.jobs = jobs
+    return test_client
+
+
+def test_upload_round_trip_is_byte_exact(client, tmp_path):
+    video = os.urandom(3 << 20)
+    response = client.post(
+        "/upload",
+        files={"file": ("clip.mp4", video, "video/mp4")},
+        data={"user_id": "demo-user"},
+    )
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    saved = tmp_path / f"{job_id}.mp4"
+    assert saved.read_bytes() == video
+    name, *args = client.jobs[0]
+    assert name == "record_upload_job"
+    assert args == [job_id, "demo-user", "clip.mp4", str(saved), len(video), "video/mp4"]
+    message = upload_app.publish_queue.get_nowait()
+    assert message["file_path"] == str(saved)
+
+
+def test_upload_rejects_non_video_file(client, tmp_path):
+    response = client.post("/upload", files={"file": ("notes.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_rejects_oversized_body(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_app, "MAX_UPLOAD_BYTES", 1024)
+    response = client.post("/upload", files={"file": ("clip.mp4", b"\0" * 4096, "video/mp4")})
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_enforces_size_limit_while_streaming(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_app, "MAX_UPLOAD_BYTES", 1024)
+    boundary = "upload-boundary"
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="clip.mp4"\r\n'
+        "Content-Type: video/mp4\r\n\r\n"
+    ).encode()
+
+    def body():
+        # A generator body is sent chunked, without a Content-Length to check up front
+        yield head
+        for _ in range(8):
+            yield b"\0" * 512
+
+    response = client.post(
+        "/upload",
+        content=body(),
+        headers={"content-type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_rejects_non_multipart_request(client):
+    response = client.post("/upload", content=b"\0" * 16, headers={"content-type": "video/mp4"})
+    assert response.status_code == 400
+
+
+def test_write_chunks_resumes_after_partial_writev(monkeypatch):
+    monkeypatch.setattr(upload_app, "WRITEV_MAX_CHUNKS", 2)
+    written = bytearray()
+    calls = []
+
+    def partial_writev(fd, buffers):
+        # Accept at most 5 bytes per call, like a short write to a pipe or full disk
+        calls.append(len(buffers))
+        data = b"".join(bytes(buffer) for buffer in buffers)[:5]
+        written.extend(data)
+        return len(data)
+
+    monkeypatch.setattr(upload_app.os, "writev", partial_writev)
+    chunks = [b"abc", b"defgh", b"ij", b"klmnopq"]
+    upload_app.write_chunks(-1, list(chunks))
+    assert bytes(written) == b"".join(chunks)
+    assert max(calls) <= 2